@@ -8,139 +8,244 @@ This module handles the core workflow orchestration logic:
 """
 
 import asyncio
-import json
-import heapq
-from typing import Optional
+import itertools
+import logging
+from typing import Dict, Optional
+from sqlalchemy import and_, func
 from .agents import make_agent
 from .db import SessionLocal
+from .jsonutil import dumps, loads
 from .models import (
     Patient, Ticket, Doctor, AgentLog,
     UrgencyEnum, TicketStatus
 )
 from .notifications import send_pushover, broadcast_to_doctor
 
+logger = logging.getLogger(__name__)
+
+# Valid urgency strings accepted from the triage agent
+_URGENCY_VALUES = frozenset(e.value for e in UrgencyEnum)
+
 # ---------------------------------------------------------------------------
 # PRIORITY QUEUE IMPLEMENTATION
 # ---------------------------------------------------------------------------
 
-class PriorityQueue:
-    """
-    Async-safe priority queue to manage patient tickets.
-    Lower priority number = higher urgency.
-    """
-    def __init__(self):
-        self._heap = []      # heap of (priority, counter, ticket_id)
-        self._counter = 0
-        self._lock = asyncio.Lock()
-
-    async def put(self, priority: int, ticket_id: int):
-        async with self._lock:
-            self._counter += 1
-            heapq.heappush(self._heap, (priority, self._counter, ticket_id))
-            print(f"🧾 Ticket {ticket_id} added to queue with priority {priority}")
-
-    async def get(self) -> Optional[int]:
-        async with self._lock:
-            if not self._heap:
-                return None
-            priority, _, ticket_id = heapq.heappop(self._heap)
-            print(f"🎯 Popped ticket {ticket_id} (priority {priority}) for allocation")
-            return ticket_id
+# Global queue of (priority, counter, ticket_id) tuples.
+# Lower priority number = higher urgency; the counter keeps FIFO order
+# among equal priorities so ticket ids are never compared.
+# Created by init_allocator() on the running loop, not at import time.
+queue: Optional[asyncio.PriorityQueue] = None
+_counter = itertools.count()
 
-    async def empty(self):
-        async with self._lock:
-            return len(self._heap) == 0
 
-
-# Global queue instance
-queue = PriorityQueue()
+async def enqueue_ticket(priority: int, ticket_id: int):
+    """Add a ticket to the allocation queue."""
+    await queue.put((priority, next(_counter), ticket_id))
+    logger.info("🧾 Ticket %s added to queue with priority %s", ticket_id, priority)
 
 # ---------------------------------------------------------------------------
 # DOCTOR ALLOCATION LOGIC
 # ---------------------------------------------------------------------------
 
-def find_available_doctor(db) -> Optional[Doctor]:
+# In-memory doctor pool: active ticket count and capacity per doctor.
+# Loaded at startup and kept in sync by the allocator so the hot path
+# never has to count tickets in the database; reloaded whenever every
+# doctor is full, which is how new doctors and discharges are picked up.
+doctor_loads: Dict[int, int] = {}
+doctor_caps: Dict[int, int] = {}
+
+# How long the allocator sleeps when every doctor is full before reloading
+# the pool from the database (same cadence as the old requeue-and-sleep retry)
+DOCTOR_RETRY_DELAY = 2
+
+# Maximum number of tickets the allocator assigns per transaction
+ALLOCATION_BATCH_SIZE = 32
+
+
+def init_allocator():
     """
-    Return first doctor with fewer than max_patients active.
+    Create the allocation queue.
+    Must run inside the event loop that will use it (called from app
+    startup): on Python < 3.10 asyncio primitives bind to the loop that
+    is current when they are constructed.
     """
-    doctors = db.query(Doctor).all()
-    for d in doctors:
-        active = db.query(Ticket).filter(
-            Ticket.doctor_id == d.id,
+    global queue
+    queue = asyncio.PriorityQueue()
+
+
+def init_doctor_pool(db):
+    """
+    Load every doctor's capacity and current active ticket count
+    with a single GROUP BY query.
+    """
+    rows = (
+        db.query(Doctor.id, func.coalesce(Doctor.max_patients, 5), func.count(Ticket.id))
+        .outerjoin(Ticket, and_(
+            Ticket.doctor_id == Doctor.id,
             Ticket.status != TicketStatus.discharged
-        ).count()
-        if active < (d.max_patients or 5):
-            return d
-    return None
+        ))
+        .group_by(Doctor.id)
+        .all()
+    )
+    doctor_loads.clear()
+    doctor_caps.clear()
+    for doctor_id, cap, active in rows:
+        doctor_caps[doctor_id] = cap
+        doctor_loads[doctor_id] = active
+
+
+def find_available_doctor(pending: Optional[Dict[int, int]] = None) -> Optional[int]:
+    """
+    Return the id of the least-loaded doctor with fewer than max_patients
+    active, or None if everyone is at capacity.
+    `pending` holds slots already claimed by the current, not yet
+    committed, allocation batch.
+    """
+    pending = pending or {}
+    loads = ((doctor_loads[d] + pending.get(d, 0), d) for d in doctor_loads)
+    best = min(
+        ((load, doctor_id) for load, doctor_id in loads
+         if load < doctor_caps[doctor_id]),
+        default=None,
+    )
+    return best[1] if best else None
+
+
+async def wait_for_doctor():
+    """
+    Sleep for DOCTOR_RETRY_DELAY, then reload the pool from the database
+    so doctors added and tickets discharged since the last load are
+    picked up.
+    """
+    await asyncio.sleep(DOCTOR_RETRY_DELAY)
+    db = SessionLocal()
+    try:
+        init_doctor_pool(db)
+    finally:
+        db.close()
+
+
+async def _notify_assignment(ticket_id: int, doctor_id: int, pushover_user: Optional[str]):
+    """Send push + websocket notification for one assignment."""
+    await send_pushover(
+        user_key=pushover_user,
+        title="New Patient Assigned",
+        message=f"Ticket {ticket_id} assigned to you"
+    )
+
+    # WebSocket broadcast
+    try:
+        await broadcast_to_doctor(doctor_id, {
+            "event": "ticket_assigned",
+            "ticket_id": ticket_id
+        })
+    except Exception:
+        pass
 
 
 async def allocation_worker():
     """
     Background worker that:
-     1. Pops tickets from priority queue
-     2. Finds an available doctor
-     3. Assigns ticket
-     4. Sends push + websocket notification
+     1. Pops a batch of tickets from priority queue
+     2. Finds an available doctor for each
+     3. Assigns the whole batch in one transaction
+     4. Sends push + websocket notifications
     """
-    print("⚙️ Allocation worker started...")
+    logger.info("⚙️ Allocation worker started...")
     while True:
-        ticket_id = await queue.get()
-        if ticket_id is None:
-            await asyncio.sleep(0.5)
-            continue
-
-        db = SessionLocal()
+        # Blocks until a ticket is available — no polling
+        batch = [await queue.get()]
+        # Drain whatever else is already waiting, up to the batch size
+        while len(batch) < ALLOCATION_BATCH_SIZE:
+            try:
+                batch.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+        assignments = []    # (ticket_id, doctor_id, pushover_user)
+        claimed: Dict[int, int] = {}    # doctor_id -> slots taken by this batch
+        wait = False
+        unhandled = len(batch)    # batch[:unhandled] isn't back in the queue
         try:
-            ticket = db.query(Ticket).get(ticket_id)
-            if not ticket:
-                continue
-            if ticket.doctor_id:
-                continue
-
-            doctor = find_available_doctor(db)
-            if not doctor:
-                # No available doctors — retry later
-                print("⏳ No doctors available, requeueing ticket...")
-                await queue.put(ticket.priority_score + 5, ticket.id)
-                await asyncio.sleep(2)
-                continue
-
-            ticket.doctor_id = doctor.id
-            db.add(ticket)
-            db.commit()
-
-            # Create log
-            log = AgentLog(
-                ticket_id=ticket.id,
-                agent_name="allocator",
-                stage="allocation",
-                structured_output=json.dumps({"doctor_id": doctor.id}),
-                raw_message=f"Assigned to doctor {doctor.name}"
-            )
-            db.add(log)
-            db.commit()
-
-            print(f"✅ Ticket {ticket.id} assigned to Doctor {doctor.name} (ID: {doctor.id})")
-
-            # Send notification
-            send_pushover(
-                user_key=doctor.pushover_user,
-                title="New Patient Assigned",
-                message=f"Ticket {ticket.id} assigned to you"
-            )
-
-            # WebSocket broadcast
+            db = SessionLocal()
             try:
-                await broadcast_to_doctor(doctor.id, {
-                    "event": "ticket_assigned",
-                    "ticket_id": ticket.id
-                })
-            except Exception:
-                pass
+                for i, (priority, _, ticket_id) in enumerate(batch):
+                    logger.info("🎯 Popped ticket %s (priority %s) for allocation", ticket_id, priority)
+                    ticket = db.get(Ticket, ticket_id)
+                    if not ticket:
+                        continue
+                    if ticket.doctor_id:
+                        continue
+
+                    doctor = None
+                    while doctor is None:
+                        doctor_id = find_available_doctor(claimed)
+                        if doctor_id is None:
+                            break
+                        doctor = db.get(Doctor, doctor_id)
+                        if doctor is None:
+                            # Deleted since the pool was loaded: forget it and pick again
+                            doctor_loads.pop(doctor_id, None)
+                            doctor_caps.pop(doctor_id, None)
+
+                    if doctor is None:
+                        # No available doctors — requeue and retry after a pool reload
+                        logger.info("⏳ No doctors available, requeueing ticket...")
+                        await enqueue_ticket(ticket.priority_score + 5, ticket.id)
+                        # The rest of the batch was never tried: put it back untouched
+                        for item in batch[i + 1:]:
+                            queue.put_nowait(item)
+                        unhandled = i
+                        wait = True
+                        break
+
+                    ticket.doctor_id = doctor.id
+                    claimed[doctor.id] = claimed.get(doctor.id, 0) + 1
+
+                    # Create log
+                    db.add(AgentLog(
+                        ticket_id=ticket.id,
+                        agent_name="allocator",
+                        stage="allocation",
+                        structured_output=dumps({"doctor_id": doctor.id}),
+                        raw_message=f"Assigned to doctor {doctor.name}"
+                    ))
+                    assignments.append((ticket.id, doctor.id, doctor.pushover_user))
+                    logger.info("✅ Ticket %s assigned to Doctor %s (ID: %s)", ticket.id, doctor.name, doctor.id)
+
+                # One commit for every assignment in the batch
+                db.commit()
+            finally:
+                db.close()  # rolls back anything left uncommitted
+        except Exception:
+            # Nothing in the batch was committed: put its tickets back and
+            # retry after the usual delay
+            logger.exception("❌ Allocation batch failed, requeueing its tickets")
+            for item in batch[:unhandled]:
+                queue.put_nowait(item)
+            assignments = []
+            wait = True
+        else:
+            # Only count the slots once they are actually committed
+            for doctor_id, n in claimed.items():
+                doctor_loads[doctor_id] = doctor_loads.get(doctor_id, 0) + n
         finally:
-            db.close()
+            # Requeued tickets were put back as new items, so queue.join()
+            # only returns once every ticket has been handled
+            for _ in batch:
+                queue.task_done()
+
+        # Send notifications for committed assignments; failures here are
+        # only logged, so assigned tickets are never retried or re-notified
+        results = await asyncio.gather(
+            *(_notify_assignment(*a) for a in assignments), return_exceptions=True
+        )
+        for error in results:
+            if error is not None:
+                logger.error("❌ Assignment notification failed: %s", error)
 
-        await asyncio.sleep(0.3)
+        if wait:
+            await wait_for_doctor()
 
 
 # ---------------------------------------------------------------------------
@@ -155,39 +260,37 @@ async def start_patient_workflow(name: str, age: int = None, symptoms: str = Non
       2. Run Reception agent
       3. Run Triage agent (sets urgency)
       4. Add ticket to allocation queue
+    All records are written in a single transaction once triage completes.
     """
     db = SessionLocal()
     try:
         # 1️⃣ Create patient record
         patient = Patient(name=name, age=age, symptoms=symptoms)
         db.add(patient)
-        db.commit()
-        db.refresh(patient)
 
-        # 2️⃣ Create ticket
+        # 2️⃣ Create ticket (linked via relationship, ids are assigned at commit)
         ticket = Ticket(
-            patient_id=patient.id,
+            patient=patient,
             status=TicketStatus.created,
             urgency=UrgencyEnum.normal,
             priority_score=50
         )
         db.add(ticket)
-        db.commit()
-        db.refresh(ticket)
 
         # 3️⃣ Reception agent (mock)
         reception_agent = make_agent("reception")
         reception_prompt = f"Register patient: {name}, age {age}, symptoms: {symptoms}"
         reception_response = await reception_agent.send(reception_prompt)
+        # Only staged in the session: it is written by the final commit,
+        # so no DB I/O sits between the reception and triage calls.
         db.add(AgentLog(
-            ticket_id=ticket.id,
+            ticket=ticket,
             agent_name="reception",
             stage="reception",
             structured_output=reception_response,
             raw_message=reception_response
         ))
-        db.commit()
-        print(f"📋 Reception completed for {name}")
+        logger.info("📋 Reception completed for %s", name)
 
         # 4️⃣ Triage agent
         triage_agent = make_agent("triage")
@@ -196,32 +299,30 @@ async def start_patient_workflow(name: str, age: int = None, symptoms: str = Non
 
         # Parse JSON
         try:
-            triage_json = json.loads(triage_response)
+            triage_json = loads(triage_response)
         except Exception:
             triage_json = {"urgency": "normal", "score": 50, "recommended_tests": []}
 
         urgency = triage_json.get("urgency", "normal")
         score = int(triage_json.get("score", 50))
 
-        ticket.urgency = UrgencyEnum(urgency) if urgency in [e.value for e in UrgencyEnum] else UrgencyEnum.normal
+        ticket.urgency = UrgencyEnum(urgency) if urgency in _URGENCY_VALUES else UrgencyEnum.normal
         ticket.priority_score = max(0, 100 - score)
         ticket.status = TicketStatus.triage_done
-        db.add(ticket)
-        db.commit()
 
         db.add(AgentLog(
-            ticket_id=ticket.id,
+            ticket=ticket,
             agent_name="triage",
             stage="triage",
-            structured_output=json.dumps(triage_json),
+            structured_output=dumps(triage_json),
             raw_message=triage_response
         ))
         db.commit()
 
-        print(f"🩺 Triage done: urgency={urgency}, priority={ticket.priority_score}")
+        logger.info("🩺 Triage done: urgency=%s, priority=%s", urgency, ticket.priority_score)
 
         # 5️⃣ Push to allocation queue
-        await queue.put(ticket.priority_score, ticket.id)
+        await enqueue_ticket(ticket.priority_score, ticket.id)
         return ticket.id
 
     finally:
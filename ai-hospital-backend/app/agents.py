@@ -9,6 +9,7 @@ This file allows the orchestrator to use either:
 
 import os
 import json
+from functools import lru_cache
 from typing import Any
 from .mock_llm import MockAssistant
 
@@ -53,9 +54,19 @@ class AssistantInterface:
         return await self._impl.send(prompt)
 
 
+@lru_cache(maxsize=None)
+def _mock_agent(role: str) -> AssistantInterface:
+    """Shared mock agent per role (mock agents keep no per-call state)."""
+    return AssistantInterface(role)
+
+
 def make_agent(role: str) -> AssistantInterface:
     """
     Factory function to create agent instances.
     Example: make_agent('reception'), make_agent('triage'), etc.
+    Mock agents are reused per role; real LLM agents keep conversation
+    history, so every call gets a fresh one and patients never share context.
     """
-    return AssistantInterface(role)
+    if USE_REAL_AUTOGEN:
+        return AssistantInterface(role)
+    return _mock_agent(role)
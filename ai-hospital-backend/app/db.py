@@ -5,25 +5,61 @@ Handles database connection and session management for the hospital system.
 """
 
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 # Database path (from environment or default to local SQLite file)
 DB_PATH = os.getenv("HMS_DB", "data/hms.db")
 DB_DIR = os.path.dirname(DB_PATH)
 
-# Create directory if it doesn’t exist
-if DB_DIR and not os.path.exists(DB_DIR):
+# SQLAlchemy database URL (HMS_DATABASE_URL overrides the file path,
+# e.g. to point the tests at an in-memory database)
+SQLALCHEMY_DATABASE_URL = os.getenv("HMS_DATABASE_URL", f"sqlite:///{DB_PATH}")
+
+# Create directory if it doesn’t exist (only needed for the file database)
+if "HMS_DATABASE_URL" not in os.environ and DB_DIR and not os.path.exists(DB_DIR):
     os.makedirs(DB_DIR, exist_ok=True)
 
-# SQLAlchemy database URL
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
+# Log every SQL statement (debugging only; set HMS_DB_ECHO=true in .env)
+DB_ECHO = os.getenv("HMS_DB_ECHO", "false").lower() == "true"
+
+# In-memory databases share one connection across all threads (StaticPool),
+# so every session sees the same data; file databases get a connection
+# pool sized for API + allocator
+IN_MEMORY = ":memory:" in SQLALCHEMY_DATABASE_URL or "mode=memory" in SQLALCHEMY_DATABASE_URL
+pool_args = {"poolclass": StaticPool} if IN_MEMORY else {"pool_size": 10, "max_overflow": 20}
 
 # For SQLite, we must disable thread check
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    echo=DB_ECHO,
+    **pool_args,
+)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, _):
+    """
+    Tune every new SQLite connection for the allocator + API workload:
+    WAL lets the GET endpoints read while the allocator writes, and
+    synchronous=NORMAL skips the per-commit fsync (still safe under WAL).
+    """
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA cache_size=-65536")     # 64 MiB page cache
+    cur.execute("PRAGMA mmap_size=268435456")   # 256 MiB memory-mapped I/O
+    cur.close()
+
 
-# Create a configured session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create a configured session factory. Objects keep their loaded state after
+# commit(), so reading e.g. ticket.id afterwards doesn't re-SELECT the row.
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
+)
 
 
 def get_db():
@@ -40,8 +76,13 @@ def get_db():
 
 def init_db(Base):
     """
-    Initializes the database — creates tables if missing.
+    Initializes the database — creates tables and indexes if missing.
     Called once on FastAPI startup.
     """
     Base.metadata.create_all(bind=engine)
+    # create_all() skips tables that already exist, so indexes added to the
+    # models later would never reach an existing database without this
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
@@ -0,0 +1,17 @@
+"""
+jsonutil.py
+===========
+Fast JSON helpers backed by orjson.
+Agent responses and AgentLog payloads are stored as text, so dumps()
+returns a str instead of orjson's bytes.
+"""
+
+import orjson
+
+# Parse a JSON str/bytes payload
+loads = orjson.loads
+
+
+def dumps(obj) -> str:
+    """Serialize an object to a JSON string."""
+    return orjson.dumps(obj).decode()
@@ -12,40 +12,107 @@ It:
 
 import os
 import asyncio
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from dataclasses import dataclass
+from typing import Tuple
+from fastapi import APIRouter, FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload
 from .db import init_db, SessionLocal
 from .models import Base, Ticket, Doctor
 from .schemas import StartRequest
-from .agent_manager import start_patient_workflow, allocation_worker
-from .notifications import register_ws, unregister_ws
+from .agent_manager import (
+    start_patient_workflow, allocation_worker, init_allocator, init_doctor_pool
+)
+from .notifications import register_ws, unregister_ws, close_pushover_client
 
 # ---------------------------------------------------------------------------
-# APP INITIALIZATION
+# APP CONFIGURATION
 # ---------------------------------------------------------------------------
 
-app = FastAPI(title="AI Hospital Backend", version="1.0")
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class AppConfig:
+    """
+    Settings that shape the FastAPI app object.
+    Frozen (and therefore hashable) so app instances can be cached per config.
+    """
+    title: str = "AI Hospital Backend"
+    version: str = "1.0"
+    # Allow Angular frontend to communicate
+    cors_origins: Tuple[str, ...] = ("http://localhost:4200",)
+
+
+# Routes are collected here and attached to each app built by create_app()
+router = APIRouter()
+
+
+# ---------------------------------------------------------------------------
+# LOGGING
+# ---------------------------------------------------------------------------
+
+_log_listener = None
+
+
+def setup_logging():
+    """
+    Route log records through a queue so the event loop never blocks on
+    stdout/stderr writes; a QueueListener thread does the actual I/O.
+    Uvicorn's per-request access log is separate — run with
+    `--no-access-log` if it isn't needed.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return
+
+    log_queue = SimpleQueue()
+    logging.getLogger().addHandler(QueueHandler(log_queue))
+    logging.getLogger(__package__).setLevel(logging.INFO)
+    _log_listener = QueueListener(log_queue, logging.StreamHandler())
+    _log_listener.start()
 
-# Allow Angular frontend to communicate
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:4200"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+
+def stop_logging():
+    """Flush pending records and stop the background log thread."""
+    global _log_listener
+    if _log_listener is None:
+        return
+    _log_listener.stop()
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, QueueHandler)]:
+        root.removeHandler(handler)
+    _log_listener = None
 
 
 # ---------------------------------------------------------------------------
 # APP STARTUP EVENT
 # ---------------------------------------------------------------------------
-@app.on_event("startup")
+
+# The database, allocator, Pushover client, and log listener are shared by
+# every app built with create_app(): the first app to start sets them up
+# and the last one to stop tears them down.
+_running_apps = 0
+_allocator_task = None
+
+
 async def startup_event():
     """
     Called when FastAPI starts.
     Initializes the database, seeds doctors, and starts background workers.
     """
-    print("🚀 Starting AI Hospital Backend...")
+    global _running_apps, _allocator_task
+    if _running_apps > 0:
+        _running_apps += 1
+        return  # already started by another app in this process
+
+    setup_logging()
+    logger.info("🚀 Starting AI Hospital Backend...")
     init_db(Base)  # Create tables if missing
 
     db = SessionLocal()
@@ -53,37 +120,67 @@ async def startup_event():
     # Check if doctors already exist
     doctor_count = db.query(Doctor).count()
     if doctor_count == 0:
-        print("🩺 No doctors found. Seeding default doctors...")
+        logger.info("🩺 No doctors found. Seeding default doctors...")
         doctors = [
-            Doctor(name="Dr. Alice", specialty="General Medicine", max_patients=5),
-            Doctor(name="Dr. Bob", specialty="Cardiology", max_patients=5),
-            Doctor(name="Dr. Clara", specialty="Neurology", max_patients=5),
-            Doctor(name="Dr. Daniel", specialty="Orthopedics", max_patients=5),
-            Doctor(name="Dr. Emma", specialty="Dermatology", max_patients=5),
-            Doctor(name="Dr. Frank", specialty="Pediatrics", max_patients=5),
-            Doctor(name="Dr. Grace", specialty="Ophthalmology", max_patients=5),
-            Doctor(name="Dr. Henry", specialty="Psychiatry", max_patients=5),
-            Doctor(name="Dr. Ivy", specialty="Gynecology", max_patients=5),
-            Doctor(name="Dr. Jack", specialty="Radiology", max_patients=5),
+            {"name": "Dr. Alice", "specialty": "General Medicine", "max_patients": 5},
+            {"name": "Dr. Bob", "specialty": "Cardiology", "max_patients": 5},
+            {"name": "Dr. Clara", "specialty": "Neurology", "max_patients": 5},
+            {"name": "Dr. Daniel", "specialty": "Orthopedics", "max_patients": 5},
+            {"name": "Dr. Emma", "specialty": "Dermatology", "max_patients": 5},
+            {"name": "Dr. Frank", "specialty": "Pediatrics", "max_patients": 5},
+            {"name": "Dr. Grace", "specialty": "Ophthalmology", "max_patients": 5},
+            {"name": "Dr. Henry", "specialty": "Psychiatry", "max_patients": 5},
+            {"name": "Dr. Ivy", "specialty": "Gynecology", "max_patients": 5},
+            {"name": "Dr. Jack", "specialty": "Radiology", "max_patients": 5},
         ]
-        db.add_all(doctors)
+        # Single multi-row INSERT, bypassing the ORM unit of work
+        db.execute(insert(Doctor).values(doctors))
         db.commit()
-        print("✅ Default doctors have been seeded.")
+        logger.info("✅ Default doctors have been seeded.")
     else:
-        print(f"🩻 {doctor_count} doctors already exist in the system.")
+        logger.info("🩻 %d doctors already exist in the system.", doctor_count)
 
+    # Load doctor capacities and current workloads for the allocator
+    init_doctor_pool(db)
     db.close()
 
     # Start the background patient allocation worker
-    asyncio.create_task(allocation_worker())
-    print("⚙️ Allocation worker started...")
+    init_allocator()
+    _allocator_task = asyncio.create_task(allocation_worker())
+
+    # Counted only once everything above succeeded, so a failed startup
+    # is retried in full by the next app that starts
+    _running_apps += 1
+
+
+async def shutdown_event():
+    """
+    Called when FastAPI stops.
+    Once no other app is running, stops the allocation worker, releases
+    the shared Pushover HTTP client, and flushes pending logs.
+    """
+    global _running_apps, _allocator_task
+    _running_apps = max(_running_apps - 1, 0)
+    if _running_apps > 0:
+        return  # another app in this process still needs them
+
+    if _allocator_task is not None:
+        _allocator_task.cancel()
+        try:
+            await _allocator_task
+        except asyncio.CancelledError:
+            pass
+        _allocator_task = None
+
+    await close_pushover_client()
+    stop_logging()
 
 
 # ---------------------------------------------------------------------------
 # API ENDPOINTS
 # ---------------------------------------------------------------------------
 
-@app.post("/api/patients/start")
+@router.post("/api/patients/start")
 async def api_start_patient(req: StartRequest):
     """
     Start a new patient workflow.
@@ -97,15 +194,15 @@ async def api_start_patient(req: StartRequest):
     return {"ticket_id": ticket_id, "message": "Workflow started successfully"}
 
 
-@app.get("/api/tickets/{ticket_id}")
+@router.get("/api/tickets/{ticket_id}")
 async def api_get_ticket(ticket_id: int):
     """
     Get a specific ticket's status and assignment.
     """
     db = SessionLocal()
     try:
-        # ✅ Use new SQLAlchemy 2.x API
-        ticket = db.get(Ticket, ticket_id)
+        # Eager-load the patient so the response needs a single query
+        ticket = db.get(Ticket, ticket_id, options=[joinedload(Ticket.patient)])
         if not ticket:
             raise HTTPException(status_code=404, detail="Ticket not found")
 
@@ -124,7 +221,7 @@ async def api_get_ticket(ticket_id: int):
         db.close()
 
 
-@app.get("/api/doctor/{doctor_id}/tickets")
+@router.get("/api/doctor/{doctor_id}/tickets")
 async def api_get_doctor_tickets(doctor_id: int):
     """
     Get all tickets assigned to a specific doctor (for doctor dashboard).
@@ -136,7 +233,12 @@ async def api_get_doctor_tickets(doctor_id: int):
         if not doctor:
             raise HTTPException(status_code=404, detail="Doctor not found")
 
-        tickets = db.query(Ticket).filter(Ticket.doctor_id == doctor_id).all()
+        tickets = (
+            db.query(Ticket)
+            .options(joinedload(Ticket.patient))
+            .filter(Ticket.doctor_id == doctor_id)
+            .all()
+        )
         return [
             {
                 "id": t.id,
@@ -154,7 +256,7 @@ async def api_get_doctor_tickets(doctor_id: int):
 # WEBSOCKET ENDPOINT
 # ---------------------------------------------------------------------------
 
-@app.websocket("/ws/doctor/{doctor_id}")
+@router.websocket("/ws/doctor/{doctor_id}")
 async def websocket_doctor(ws: WebSocket, doctor_id: int):
     """
     WebSocket endpoint for real-time notifications.
@@ -168,14 +270,47 @@ async def websocket_doctor(ws: WebSocket, doctor_id: int):
             await ws.send_text(f"Echo: {data}")
     except WebSocketDisconnect:
         unregister_ws(doctor_id, ws)
-        print(f"Doctor {doctor_id} disconnected from WebSocket.")
+        logger.info("Doctor %s disconnected from WebSocket.", doctor_id)
 
 
 # ---------------------------------------------------------------------------
 # ROOT ENDPOINT
 # ---------------------------------------------------------------------------
 
-@app.get("/")
+@router.get("/")
 def root():
     """Basic health check endpoint."""
     return {"message": "AI Hospital Backend is running!"}
+
+
+# ---------------------------------------------------------------------------
+# APP FACTORY
+# ---------------------------------------------------------------------------
+
+def create_app(config: AppConfig = AppConfig()) -> FastAPI:
+    """
+    Build a FastAPI app for the given config: routes, CORS, and the
+    startup/shutdown handlers. Database, queue, and worker state stay
+    module-level and are started once per process, however many apps
+    are built.
+    """
+    # orjson-backed responses: faster serialization, emitted straight as bytes
+    application = FastAPI(
+        title=config.title,
+        version=config.version,
+        default_response_class=ORJSONResponse,
+    )
+    application.add_middleware(
+        CORSMiddleware,
+        allow_origins=list(config.cors_origins),
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    application.include_router(router)
+    application.router.add_event_handler("startup", startup_event)
+    application.router.add_event_handler("shutdown", shutdown_event)
+    return application
+
+
+app = create_app()
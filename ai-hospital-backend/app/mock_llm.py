@@ -5,8 +5,70 @@ A simple mock assistant for local testing (no API calls).
 Each agent returns deterministic JSON responses for predictable testing.
 """
 
+import os
 import asyncio
-import json
+from .jsonutil import dumps
+
+# Simulated agent latency (set MOCK_LATENCY_MS=200 in .env for a realistic demo)
+_MOCK_SLEEP = float(os.getenv("MOCK_LATENCY_MS", "0")) / 1000.0
+
+# Triage keywords (matched against the lowercased prompt)
+_CRITICAL_KEYWORDS = ("chest pain", "bleeding", "unconscious")
+_URGENT_KEYWORDS = ("fever", "pain", "infection")
+
+
+# Precomputed responses for agents whose output does not depend on the prompt
+_STATIC_RESPONSES = {
+    "reception": dumps({
+        "action": "registered",
+        "patient_id": 0,
+        "message": "Patient registered successfully (mock)."
+    }),
+    "diagnostic": dumps({
+        "tests_ordered": ["CBC", "Chest X-ray"],
+        "expected_time_mins": 45,
+        "notes": "Mock diagnostic plan."
+    }),
+    "physician": dumps({
+        "diagnosis": "Acute bronchitis (mock)",
+        "plan": "Rest, hydration, antibiotics",
+        "prescription": [{"drug": "Amoxicillin", "dose": "500mg", "freq": "TID"}]
+    }),
+    "pharmacy": dumps({
+        "available": True,
+        "items": [{"drug": "Amoxicillin", "qty": 10}],
+        "warnings": []
+    }),
+    "billing": dumps({
+        "estimate": 120.0,
+        "currency": "USD",
+        "items": [
+            {"desc": "Consultation", "amt": 50},
+            {"desc": "Lab Tests", "amt": 70}
+        ]
+    }),
+}
+
+# All agent kinds the mock knows, matched as a prefix of the agent name
+_AGENT_KINDS = ("triage", *_STATIC_RESPONSES)
+
+
+def _triage_response(prompt: str) -> str:
+    """Derive urgency and score from keywords in the prompt."""
+    urgency = "normal"
+    score = 60
+    text = prompt.lower()
+    if any(word in text for word in _CRITICAL_KEYWORDS):
+        urgency = "critical"
+        score = 95
+    elif any(word in text for word in _URGENT_KEYWORDS):
+        urgency = "urgent"
+        score = 80
+    return dumps({
+        "urgency": urgency,
+        "score": score,
+        "recommended_tests": ["CBC", "X-Ray"]
+    })
 
 
 class MockAssistant:
@@ -17,75 +79,27 @@ class MockAssistant:
 
     def __init__(self, name: str):
         self.name = name
+        # Resolve the agent kind once so send() is a dict lookup
+        lowered = name.lower()
+        self._kind = next((k for k in _AGENT_KINDS if lowered.startswith(k)), None)
 
     async def send(self, prompt: str) -> str:
         """
         Simulate thinking and return structured JSON depending on agent type.
         """
 
-        # Simulate small processing delay
-        await asyncio.sleep(0.2)
-
-        # Reception agent
-        if self.name.lower().startswith("reception"):
-            return json.dumps({
-                "action": "registered",
-                "patient_id": 0,
-                "message": "Patient registered successfully (mock)."
-            })
-
-        # Triage agent
-        if self.name.lower().startswith("triage"):
-            urgency = "normal"
-            score = 60
-            if any(word in prompt.lower() for word in ["chest pain", "bleeding", "unconscious"]):
-                urgency = "critical"
-                score = 95
-            elif any(word in prompt.lower() for word in ["fever", "pain", "infection"]):
-                urgency = "urgent"
-                score = 80
-            return json.dumps({
-                "urgency": urgency,
-                "score": score,
-                "recommended_tests": ["CBC", "X-Ray"]
-            })
-
-        # Diagnostic agent
-        if self.name.lower().startswith("diagnostic"):
-            return json.dumps({
-                "tests_ordered": ["CBC", "Chest X-ray"],
-                "expected_time_mins": 45,
-                "notes": "Mock diagnostic plan."
-            })
-
-        # Physician agent
-        if self.name.lower().startswith("physician"):
-            return json.dumps({
-                "diagnosis": "Acute bronchitis (mock)",
-                "plan": "Rest, hydration, antibiotics",
-                "prescription": [{"drug": "Amoxicillin", "dose": "500mg", "freq": "TID"}]
-            })
-
-        # Pharmacy agent
-        if self.name.lower().startswith("pharmacy"):
-            return json.dumps({
-                "available": True,
-                "items": [{"drug": "Amoxicillin", "qty": 10}],
-                "warnings": []
-            })
-
-        # Billing agent
-        if self.name.lower().startswith("billing"):
-            return json.dumps({
-                "estimate": 120.0,
-                "currency": "USD",
-                "items": [
-                    {"desc": "Consultation", "amt": 50},
-                    {"desc": "Lab Tests", "amt": 70}
-                ]
-            })
+        # Simulate processing delay (disabled by default)
+        if _MOCK_SLEEP:
+            await asyncio.sleep(_MOCK_SLEEP)
+
+        response = _STATIC_RESPONSES.get(self._kind)
+        if response is not None:
+            return response
+
+        if self._kind == "triage":
+            return _triage_response(prompt)
 
         # Fallback for unknown agents
-        return json.dumps({
+        return dumps({
             "message": f"Mock response from {self.name}"
         })
@@ -9,7 +9,7 @@ Contains tables for:
  - AgentLog
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum, Index
 from sqlalchemy.orm import declarative_base, relationship
 import datetime
 import enum
@@ -69,11 +69,16 @@ class Doctor(Base):
 class Ticket(Base):
     """Tracks patient workflow, doctor assignment, and urgency."""
     __tablename__ = "tickets"
+    __table_args__ = (
+        # Covers doctor-load counts and per-doctor ticket listings
+        # (doctor_id is its leading column, so no separate index needed)
+        Index("ix_tickets_doctor_status", "doctor_id", "status"),
+    )
 
     id = Column(Integer, primary_key=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
     doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=True)
-    status = Column(Enum(TicketStatus), default=TicketStatus.created)
+    status = Column(Enum(TicketStatus), default=TicketStatus.created, index=True)
     urgency = Column(Enum(UrgencyEnum), default=UrgencyEnum.normal)
     priority_score = Column(Integer, default=50)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -89,7 +94,7 @@ class AgentLog(Base):
     __tablename__ = "agent_logs"
 
     id = Column(Integer, primary_key=True)
-    ticket_id = Column(Integer, ForeignKey("tickets.id"), nullable=True)
+    ticket_id = Column(Integer, ForeignKey("tickets.id"), nullable=True, index=True)
     agent_name = Column(String)
     stage = Column(String)
     structured_output = Column(Text)  # typically JSON
@@ -5,40 +5,71 @@ Handles WebSocket and Pushover notifications for doctors.
 """
 
 import os
-import requests
-from typing import Dict, List
+import asyncio
+import logging
+import httpx
+from typing import Dict, Optional, Set
 from fastapi import WebSocket
 
+logger = logging.getLogger(__name__)
+
 # Registry to store connected WebSocket clients per doctor
-connected_doctors: Dict[int, List[WebSocket]] = {}
+connected_doctors: Dict[int, Set[WebSocket]] = {}
+
+# Shared async HTTP client for Pushover (closed on app shutdown).
+# Long-lived so the TCP/TLS connection is kept alive and reused
+# across notifications instead of re-handshaking every time.
+# Created on first use, so an app restarted in the same process
+# gets a fresh client after the old one was closed.
+_pushover_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_pushover_client() -> httpx.AsyncClient:
+    """Return the shared Pushover client, creating it if needed."""
+    global _pushover_client
+    if _pushover_client is None:
+        _pushover_client = httpx.AsyncClient(
+            http2=True,
+            timeout=5.0,
+            limits=httpx.Limits(max_keepalive_connections=10),
+        )
+    return _pushover_client
 
 # ---------------------------------------------------------------------------
 # Pushover Notification (optional)
 # ---------------------------------------------------------------------------
 
-def send_pushover(user_key: str, title: str, message: str):
+async def send_pushover(user_key: str, title: str, message: str):
     """
     Sends a push notification using the Pushover API.
     Requires PUSHOVER_TOKEN and PUSHOVER_USER in .env
+    Awaited so a slow Pushover call never blocks the event loop.
     """
     if not user_key:
         return  # no pushover user configured
 
     token = os.getenv("PUSHOVER_TOKEN")
     if not token:
-        print("⚠️  Pushover token not configured, skipping notification.")
+        logger.warning("⚠️  Pushover token not configured, skipping notification.")
         return
 
     try:
-        resp = requests.post(
+        resp = await _get_pushover_client().post(
             "https://api.pushover.net/1/messages.json",
             data={"token": token, "user": user_key, "title": title, "message": message},
-            timeout=5
         )
         if resp.status_code != 200:
-            print(f"❌ Pushover error: {resp.text}")
+            logger.error("❌ Pushover error: %s", resp.text)
     except Exception as e:
-        print(f"❌ Pushover send failed: {e}")
+        logger.error("❌ Pushover send failed: %s", e)
+
+
+async def close_pushover_client():
+    """Close the shared Pushover HTTP client."""
+    global _pushover_client
+    if _pushover_client is not None:
+        await _pushover_client.aclose()
+        _pushover_client = None
 
 # ---------------------------------------------------------------------------
 # WebSocket Registry
@@ -46,26 +77,33 @@ def send_pushover(user_key: str, title: str, message: str):
 
 def register_ws(doctor_id: int, ws: WebSocket):
     """Register a WebSocket connection for a doctor."""
-    connected_doctors.setdefault(doctor_id, []).append(ws)
-    print(f"🩺 Doctor {doctor_id} connected via WebSocket ({len(connected_doctors[doctor_id])} active).")
+    connected_doctors.setdefault(doctor_id, set()).add(ws)
+    logger.info("🩺 Doctor %s connected via WebSocket (%d active).", doctor_id, len(connected_doctors[doctor_id]))
 
 
 def unregister_ws(doctor_id: int, ws: WebSocket):
     """Unregister a WebSocket connection when disconnected."""
     if doctor_id in connected_doctors:
-        connected_doctors[doctor_id] = [w for w in connected_doctors[doctor_id] if w != ws]
+        connected_doctors[doctor_id].discard(ws)
         if not connected_doctors[doctor_id]:
             del connected_doctors[doctor_id]
-    print(f"❌ Doctor {doctor_id} disconnected. Remaining sockets: {len(connected_doctors.get(doctor_id, []))}")
+    logger.info("❌ Doctor %s disconnected. Remaining sockets: %d", doctor_id, len(connected_doctors.get(doctor_id, ())))
 
 
 async def broadcast_to_doctor(doctor_id: int, data: dict):
-    """Send a JSON message to all active WebSocket connections for a doctor."""
+    """
+    Send a JSON message to all active WebSocket connections for a doctor.
+    Sends run concurrently; sockets that fail are dropped from the registry.
+    """
     if doctor_id not in connected_doctors:
         return
 
-    for ws in connected_doctors[doctor_id]:
-        try:
-            await ws.send_json(data)
-        except Exception:
-            print(f"⚠️ Failed to send WS message to doctor {doctor_id}")
+    sockets = list(connected_doctors[doctor_id])
+    results = await asyncio.gather(
+        *(ws.send_json(data) for ws in sockets), return_exceptions=True
+    )
+
+    for ws, result in zip(sockets, results):
+        if isinstance(result, Exception):
+            logger.warning("⚠️ Failed to send WS message to doctor %s, dropping socket", doctor_id)
+            unregister_ws(doctor_id, ws)
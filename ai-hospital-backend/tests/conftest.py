@@ -0,0 +1,193 @@
+"""
+conftest.py
+===========
+Shared pytest fixtures for the API test suite:
+ - One test client + in-memory DB for the whole session (app startup runs once)
+ - Per-test transaction rollback so tests don't leak rows into each other
+ - Mock agents and no outbound network calls
+"""
+
+import sys, os
+import asyncio
+from functools import lru_cache
+
+# Don't write .pyc files during test runs (also inherited by xdist workers)
+sys.dont_write_bytecode = True
+os.environ.setdefault("PYTHONDONTWRITEBYTECODE", "1")
+
+# Keep all test DB traffic in RAM: a named shared-cache in-memory SQLite
+# database, set before the app modules create their engine
+os.environ["HMS_DATABASE_URL"] = "sqlite:///file:hms_test?mode=memory&cache=shared&uri=true"
+# Never log SQL in tests, even if the developer's .env enables it
+os.environ["HMS_DB_ECHO"] = "false"
+# No network or simulated latency: mock LLM agents answer instantly and
+# Pushover notifications are skipped
+os.environ["USE_REAL_AUTOGEN"] = "false"
+os.environ["MOCK_LATENCY_MS"] = "0"
+os.environ.pop("PUSHOVER_TOKEN", None)
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, insert, update
+
+try:
+    import uvloop
+except ImportError:     # optional: fall back to the stdlib asyncio loop
+    uvloop = None
+
+# Import application modules
+from app import main
+from app.main import AppConfig, create_app
+from app.db import engine, SessionLocal
+from app import agent_manager
+from app.models import Doctor
+
+
+# --------------------------------------------------------------------------
+# SQLITE SAVEPOINT SUPPORT
+# --------------------------------------------------------------------------
+# pysqlite starts transactions lazily on its own, which breaks SAVEPOINT
+# nesting. Let SQLAlchemy emit BEGIN itself so the per-test rollback below
+# really undoes everything the app committed.
+
+@event.listens_for(engine, "connect")
+def _disable_pysqlite_transactions(dbapi_conn, _):
+    dbapi_conn.isolation_level = None
+
+
+@event.listens_for(engine, "begin")
+def _emit_begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
+
+# --------------------------------------------------------------------------
+# EVENT LOOP
+# --------------------------------------------------------------------------
+
+@pytest.fixture(scope="session")
+def event_loop_policy():
+    """
+    Run the async fixtures and tests on uvloop when it is installed
+    (uvicorn[standard] already uses it in production), otherwise on the
+    stdlib asyncio loop.
+    """
+    if uvloop is not None:
+        return uvloop.EventLoopPolicy()
+    return asyncio.DefaultEventLoopPolicy()
+
+
+def pytest_collection_modifyitems(items):
+    """
+    Run every async test on the session loop that the client fixture and
+    the allocator live on (the equivalent of
+    asyncio_default_test_loop_scope, which older pytest-asyncio lacks).
+    """
+    session_loop = pytest.mark.asyncio(loop_scope="session")
+    for item in items:
+        if pytest_asyncio.is_async_test(item):
+            item.add_marker(session_loop, append=False)
+
+
+# --------------------------------------------------------------------------
+# FIXTURES
+# --------------------------------------------------------------------------
+
+@lru_cache(maxsize=8)
+def _cached_app(config: AppConfig):
+    """
+    Builds each distinct app config once per process, so tests parametrized
+    over configs don't redo route registration and OpenAPI setup.
+    The default config reuses the module-level app that uvicorn serves.
+    """
+    if config == AppConfig():
+        return main.app
+    return create_app(config)
+
+
+@pytest_asyncio.fixture(scope="session")
+async def client():
+    """
+    Starts the app once per test session and talks to it in-process.
+    Requests go straight into the ASGI app on the test event loop, with
+    no TestClient thread hop; the startup event creates the schema and
+    seeds default doctors.
+    """
+    app = _cached_app(AppConfig())
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            # Warm routing and response serialization once, so this one-time
+            # cost lands in fixture setup instead of the first test
+            await c.get("/")
+            yield c
+
+
+# Upper bound (seconds) on waiting for the allocator at test teardown
+QUEUE_DRAIN_TIMEOUT = 10
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def db_transaction(client):
+    """
+    Wraps each test in an outer transaction that is rolled back afterwards.
+    Every SessionLocal() joins it, and their commits only release a SAVEPOINT.
+    """
+    connection = engine.connect()
+    transaction = connection.begin()
+    SessionLocal.configure(bind=connection, join_transaction_mode="create_savepoint")
+
+    yield connection
+
+    try:
+        # Let the allocator finish queued tickets before their rows
+        # disappear; a wedged allocator fails the test instead of hanging
+        await asyncio.wait_for(agent_manager.queue.join(), QUEUE_DRAIN_TIMEOUT)
+    finally:
+        SessionLocal.configure(bind=engine, join_transaction_mode="conditional_savepoint")
+        transaction.rollback()
+        connection.close()
+        # The rollback also undid this test's assignments: reload the
+        # allocator's in-memory doctor loads to match
+        with SessionLocal() as db:
+            agent_manager.init_doctor_pool(db)
+
+
+@pytest.fixture
+def db_session(db_transaction):
+    """
+    A session for arranging test data, opened once per test.
+    It works inside its own SAVEPOINT on the per-test connection, so
+    flushed rows are visible to the API without ever being committed.
+    """
+    with SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+def doctor_factory(db_session):
+    """
+    Returns a helper that inserts doctor rows in one INSERT ... RETURNING
+    statement and returns their ids in input order.
+    """
+    def create(rows):
+        stmt = insert(Doctor).returning(Doctor.id, sort_by_parameter_order=True)
+        return db_session.scalars(stmt, rows).all()
+
+    return create
+
+
+@pytest.fixture
+def staff_doctors(db_session, doctor_factory):
+    """
+    Returns a helper that makes the given doctors the only ones with free
+    slots: seeded doctors drop to max_patients=0, the new rows are
+    inserted, and the allocator's pool is reloaded. Returns the new ids.
+    """
+    def staff(rows):
+        db_session.execute(update(Doctor).values(max_patients=0))
+        ids = doctor_factory(rows) if rows else []
+        agent_manager.init_doctor_pool(db_session)
+        return ids
+
+    return staff
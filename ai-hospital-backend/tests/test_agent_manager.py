@@ -0,0 +1,211 @@
+"""
+test_agent_manager.py
+=====================
+Test cases for the allocator's in-memory doctor pool.
+Tests cover:
+ - Loading capacities and active ticket counts from the database
+ - Least-loaded doctor selection and the capacity cut-off
+ - Slots claimed by an uncommitted batch (pending overlay)
+ - Dropping a doctor that was deleted after the pool was loaded
+ - Reloading the pool when every doctor is full
+ - Assigning a whole batch without exceeding any doctor's capacity
+ - Requeueing a batch whose commit failed, without retrying notifications
+"""
+
+import asyncio
+
+from sqlalchemy import delete
+
+from app import agent_manager
+from app.agent_manager import find_available_doctor, init_doctor_pool
+from app.models import Doctor, Patient, Ticket, TicketStatus
+
+
+# --------------------------------------------------------------------------
+# TESTS
+# --------------------------------------------------------------------------
+
+async def test_init_doctor_pool_counts_active_tickets(db_session, doctor_factory):
+    """
+    ✅ Test loading the pool from the database.
+    Expected: discharged tickets don't count, missing max_patients means 5.
+    """
+    busy_id, default_id = doctor_factory([
+        {"name": "Dr. Busy", "max_patients": 3},
+        {"name": "Dr. Default", "max_patients": None},
+    ])
+    db_session.add_all([
+        Ticket(doctor_id=busy_id, status=TicketStatus.triage_done),
+        Ticket(doctor_id=busy_id, status=TicketStatus.triage_done),
+        Ticket(doctor_id=busy_id, status=TicketStatus.discharged),
+    ])
+    db_session.flush()
+
+    init_doctor_pool(db_session)
+
+    assert agent_manager.doctor_loads[busy_id] == 2
+    assert agent_manager.doctor_caps[busy_id] == 3
+    assert agent_manager.doctor_loads[default_id] == 0
+    assert agent_manager.doctor_caps[default_id] == 5
+
+
+async def test_find_available_doctor_picks_least_loaded(monkeypatch):
+    """
+    ✅ Test least-loaded selection with a capacity cut-off.
+    Expected: full doctors are skipped; ties go to the lowest id.
+    """
+    monkeypatch.setattr(agent_manager, "doctor_loads", {1: 2, 2: 0, 3: 1, 4: 1})
+    monkeypatch.setattr(agent_manager, "doctor_caps", {1: 5, 2: 0, 3: 5, 4: 5})
+
+    assert find_available_doctor() == 3
+
+    monkeypatch.setattr(agent_manager, "doctor_caps", {1: 2, 2: 0, 3: 1, 4: 1})
+    assert find_available_doctor() is None
+
+
+async def test_find_available_doctor_counts_pending_slots(monkeypatch):
+    """
+    ✅ Test the overlay of slots claimed by an uncommitted batch.
+    Expected: pending slots count towards load and capacity.
+    """
+    monkeypatch.setattr(agent_manager, "doctor_loads", {1: 1, 2: 0})
+    monkeypatch.setattr(agent_manager, "doctor_caps", {1: 2, 2: 2})
+
+    assert find_available_doctor({2: 1}) == 1
+    assert find_available_doctor({2: 2}) == 1
+    assert find_available_doctor({1: 1, 2: 2}) is None
+    # The overlay is read-only: the pool itself is unchanged
+    assert agent_manager.doctor_loads == {1: 1, 2: 0}
+
+
+async def test_deleted_doctor_is_dropped_from_pool(client, db_session):
+    """
+    ✅ Test allocation when the preferred doctor no longer exists.
+    Expected: the doctor is removed from the pool and another one is used.
+    """
+    gone_id = find_available_doctor()
+    db_session.execute(delete(Doctor).where(Doctor.id == gone_id))
+    db_session.flush()
+
+    res = await client.post("/api/patients/start", json={
+        "name": "John Doe", "age": 45, "symptoms": "fever and cough",
+    })
+    await asyncio.wait_for(agent_manager.queue.join(), 5)
+
+    ticket = (await client.get(f"/api/tickets/{res.json()['ticket_id']}")).json()
+    assert ticket["doctor_id"] is not None
+    assert ticket["doctor_id"] != gone_id
+    assert gone_id not in agent_manager.doctor_loads
+
+
+async def test_full_pool_picks_up_new_doctor(client, staff_doctors, doctor_factory, monkeypatch):
+    """
+    ✅ Test the retry path when every doctor is at capacity.
+    Expected: the queued ticket waits, then goes to a doctor added later
+    once the allocator reloads the pool.
+    """
+    monkeypatch.setattr(agent_manager, "DOCTOR_RETRY_DELAY", 0.05)
+    staff_doctors([])
+
+    res = await client.post("/api/patients/start", json={
+        "name": "Jane Doe", "age": 30, "symptoms": "chest pain",
+    })
+    ticket_id = res.json()["ticket_id"]
+    assert (await client.get(f"/api/tickets/{ticket_id}")).json()["doctor_id"] is None
+
+    new_id = doctor_factory([{"name": "Dr. New", "max_patients": 1}])[0]
+    await asyncio.wait_for(agent_manager.queue.join(), 5)
+
+    assert (await client.get(f"/api/tickets/{ticket_id}")).json()["doctor_id"] == new_id
+
+
+async def _wait_until(condition, timeout=5):
+    """Poll until condition() is true, failing the test after timeout seconds."""
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+async def test_batch_respects_capacity(client, db_session, staff_doctors, doctor_factory, monkeypatch):
+    """
+    ✅ Test one allocation batch with more tickets than free slots.
+    Expected: every doctor is filled exactly to capacity, the lowest
+    priority ticket is requeued, and it is assigned once a slot appears.
+    """
+    monkeypatch.setattr(agent_manager, "DOCTOR_RETRY_DELAY", 0.05)
+    doctor_ids = staff_doctors([
+        {"name": f"Dr. {n}", "max_patients": 2} for n in ("A", "B", "C")
+    ])
+    tickets = [
+        Ticket(patient=Patient(name=f"Patient {p}"), status=TicketStatus.triage_done, priority_score=p)
+        for p in range(7)
+    ]
+    db_session.add_all(tickets)
+    db_session.flush()
+
+    # Enqueued without yielding to the worker, so it drains them as one batch
+    for t in tickets:
+        await agent_manager.enqueue_ticket(t.priority_score, t.id)
+    await _wait_until(lambda: sum(agent_manager.doctor_loads[d] for d in doctor_ids) == 6)
+
+    for doctor_id in doctor_ids:
+        assigned = (await client.get(f"/api/doctor/{doctor_id}/tickets")).json()
+        assert len(assigned) == 2
+    leftover = (await client.get(f"/api/tickets/{tickets[-1].id}")).json()
+    assert leftover["doctor_id"] is None
+
+    extra_id = doctor_factory([{"name": "Dr. Extra", "max_patients": 1}])[0]
+    await asyncio.wait_for(agent_manager.queue.join(), 5)
+
+    assert (await client.get(f"/api/tickets/{tickets[-1].id}")).json()["doctor_id"] == extra_id
+
+
+async def _start_and_allocate(client):
+    """Start one workflow, wait for the allocator, and return the ticket."""
+    res = await client.post("/api/patients/start", json={
+        "name": "John Doe", "age": 45, "symptoms": "fever and cough",
+    })
+    await asyncio.wait_for(agent_manager.queue.join(), 5)
+    return (await client.get(f"/api/tickets/{res.json()['ticket_id']}")).json()
+
+
+async def test_failed_batch_is_requeued(client, monkeypatch):
+    """
+    ✅ Test an allocation batch that fails before its commit.
+    Expected: the ticket is put back and assigned on the retry, and the
+    doctor's load is only counted once.
+    """
+    monkeypatch.setattr(agent_manager, "DOCTOR_RETRY_DELAY", 0.05)
+    real_dumps = agent_manager.dumps
+    failures = []
+
+    def flaky_dumps(obj):
+        if "doctor_id" in obj and not failures:
+            failures.append(obj)
+            raise RuntimeError("database is locked")
+        return real_dumps(obj)
+
+    monkeypatch.setattr(agent_manager, "dumps", flaky_dumps)
+
+    ticket = await _start_and_allocate(client)
+
+    assert failures
+    assert ticket["doctor_id"] is not None
+    assert agent_manager.doctor_loads[ticket["doctor_id"]] == 1
+
+
+async def test_notification_failure_keeps_assignment(client, monkeypatch):
+    """
+    ✅ Test a notification error after a successful commit.
+    Expected: the assignment stands and the ticket is not allocated twice.
+    """
+    async def broken_notify(*args):
+        raise RuntimeError("pushover down")
+
+    monkeypatch.setattr(agent_manager, "_notify_assignment", broken_notify)
+
+    ticket = await _start_and_allocate(client)
+
+    assert ticket["doctor_id"] is not None
+    assert sum(agent_manager.doctor_loads.values()) == 1
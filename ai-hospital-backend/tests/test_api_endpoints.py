@@ -8,73 +8,41 @@ Tests cover:
  - Ticket retrieval
  - Doctor ticket listing
  - Input validation
+ - Allocation of more patients than there are free doctor slots
 """
 
-import sys, os
-# Ensure the app module is discoverable by Python when running from /tests
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import asyncio
 
-import tempfile
 import pytest
-from fastapi.testclient import TestClient
 
-# Import application modules
-from app.main import app
-from app.db import init_db, SessionLocal
-from app.models import Base, Doctor
-
-
-# --------------------------------------------------------------------------
-# FIXTURE: Create isolated test client + temporary DB
-# --------------------------------------------------------------------------
-
-@pytest.fixture(scope="module")
-def client():
-    """
-    Creates a temporary SQLite database and test client.
-    This ensures that tests do not modify the production data.
-    """
-    # Create a temporary file for the SQLite DB
-    db_fd, db_path = tempfile.mkstemp()
-    os.environ["HMS_DB"] = db_path
-
-    # Initialize a clean database for testing
-    init_db(Base)
-
-    # Use FastAPI's TestClient for testing API routes
-    with TestClient(app) as c:
-        yield c
-
-    # Clean up temporary database after tests
-    os.close(db_fd)
-    os.unlink(db_path)
+from app import agent_manager
 
 
 # --------------------------------------------------------------------------
 # TESTS
 # --------------------------------------------------------------------------
 
-def test_root_endpoint(client):
+async def test_root_endpoint(client):
     """
     ✅ Test the root health check endpoint.
     Expected: 200 OK and "AI Hospital" message.
     """
-    res = client.get("/")
+    res = await client.get("/")
     assert res.status_code == 200
     assert "AI Hospital" in res.json()["message"]
 
 
-def test_start_patient_workflow(client):
+@pytest.mark.parametrize("payload, follow_up", [
+    ({"name": "John Doe", "age": 45, "symptoms": "fever and cough"}, False),
+    ({"name": "Jane Doe", "age": 30, "symptoms": "chest pain"}, True),
+], ids=["start_only", "ticket_flow"])
+async def test_start_patient_workflow(client, payload, follow_up):
     """
     ✅ Test starting a new patient workflow.
     Expected: Returns ticket_id and success message.
+    With follow_up, also retrieves the created ticket info.
     """
-    payload = {
-        "name": "John Doe",
-        "age": 45,
-        "symptoms": "fever and cough"
-    }
-    res = client.post("/api/patients/start", json=payload)
+    res = await client.post("/api/patients/start", json=payload)
     assert res.status_code == 200
 
     data = res.json()
@@ -82,65 +50,93 @@ def test_start_patient_workflow(client):
     assert isinstance(data["ticket_id"], int)
     assert data["message"] == "Workflow started successfully"
 
+    if not follow_up:
+        return
+
+    ticket_id = data["ticket_id"]
+    res2 = await client.get(f"/api/tickets/{ticket_id}")
+    assert res2.status_code == 200
+
+    data = res2.json()
+    assert data["id"] == ticket_id
+    assert "status" in data
+    assert "urgency" in data
+    assert "patient" in data
+
 
-def test_ticket_not_found(client):
+async def test_ticket_not_found(client):
     """
     ✅ Test requesting a non-existing ticket.
     Expected: 404 with 'Ticket not found' message.
     """
-    res = client.get("/api/tickets/999")
+    res = await client.get("/api/tickets/999")
     assert res.status_code == 404
     assert res.json()["detail"] == "Ticket not found"
 
 
-def test_doctor_ticket_listing(client):
+async def test_doctor_ticket_listing(client, doctor_factory):
     """
     ✅ Test adding a doctor manually and retrieving their tickets.
     Expected: Returns empty list or assigned tickets.
     """
-    db = SessionLocal()
-    doc = Doctor(name="Dr. Alice", specialty="General", max_patients=5)
-    db.add(doc)
-    db.commit()
-    db.refresh(doc)
-    db.close()
-
-    res = client.get(f"/api/doctor/{doc.id}/tickets")
-    assert res.status_code == 200
-    assert isinstance(res.json(), list)
-
-
-def test_patient_ticket_flow(client):
-    """
-    ✅ Test full patient flow:
-    - Create a patient
-    - Retrieve ticket info
-    """
-    payload = {
-        "name": "Jane Doe",
-        "age": 30,
-        "symptoms": "chest pain"
-    }
+    doc_id = doctor_factory([
+        {"name": "Dr. Alice", "specialty": "General", "max_patients": 5}
+    ])[0]
 
-    res = client.post("/api/patients/start", json=payload)
+    res = await client.get(f"/api/doctor/{doc_id}/tickets")
     assert res.status_code == 200
-    ticket_id = res.json()["ticket_id"]
-
-    res2 = client.get(f"/api/tickets/{ticket_id}")
-    assert res2.status_code == 200
-
-    data = res2.json()
-    assert data["id"] == ticket_id
-    assert "status" in data
-    assert "urgency" in data
-    assert "patient" in data
+    assert isinstance(res.json(), list)
 
 
-def test_invalid_input(client):
+async def test_invalid_input(client):
     """
     ✅ Test invalid input (missing name).
     Expected: 422 validation error from FastAPI.
     """
     payload = {"age": 30, "symptoms": "headache"}
-    res = client.post("/api/patients/start", json=payload)
+    res = await client.post("/api/patients/start", json=payload)
     assert res.status_code == 422
+
+
+async def test_allocation_overflow(client, staff_doctors, doctor_factory, monkeypatch):
+    """
+    ✅ Test starting more workflows than there are free doctor slots.
+    Expected: no doctor gets more than max_patients, the surplus tickets
+    stay unassigned, and they are assigned once capacity is added.
+    """
+    monkeypatch.setattr(agent_manager, "DOCTOR_RETRY_DELAY", 0.05)
+    capacity, surplus = 2, 3
+    doctor_ids = staff_doctors([
+        {"name": f"Dr. {n}", "max_patients": capacity} for n in ("A", "B")
+    ])
+
+    ticket_ids = []
+    for i in range(len(doctor_ids) * capacity + surplus):
+        res = await client.post("/api/patients/start", json={
+            "name": f"Patient {i}", "age": 40, "symptoms": "headache",
+        })
+        ticket_ids.append(res.json()["ticket_id"])
+
+    async def doctor_tickets():
+        return [
+            (await client.get(f"/api/doctor/{d}/tickets")).json() for d in doctor_ids
+        ]
+
+    async def all_slots_filled():
+        while sum(map(len, await doctor_tickets())) < len(doctor_ids) * capacity:
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(all_slots_filled(), 5)
+    assert all(len(t) == capacity for t in await doctor_tickets())
+
+    unassigned = [
+        t for t in ticket_ids
+        if (await client.get(f"/api/tickets/{t}")).json()["doctor_id"] is None
+    ]
+    assert len(unassigned) == surplus
+
+    extra_id = doctor_factory([{"name": "Dr. Extra", "max_patients": surplus}])[0]
+    await asyncio.wait_for(agent_manager.queue.join(), 5)
+
+    res = await client.get(f"/api/doctor/{extra_id}/tickets")
+    assert sorted(t["id"] for t in res.json()) == sorted(unassigned)
@@ -0,0 +1,70 @@
+"""
+test_main.py
+============
+Test cases for the app factory and its shared lifecycle.
+Tests cover:
+ - A second app sharing the running allocator instead of starting its own
+ - The first app stopping without breaking the one still running
+ - A failed startup not being counted as a running app
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app import agent_manager, main
+from app.main import AppConfig, create_app
+
+
+# --------------------------------------------------------------------------
+# TESTS
+# --------------------------------------------------------------------------
+
+async def test_second_app_shares_process_state(client):
+    """
+    ✅ Test starting and stopping a second app next to the session one.
+    Expected: one allocator for both; after the second app stops, the
+    first one still allocates tickets.
+    """
+    worker = main._allocator_task
+    running = main._running_apps
+    second = create_app(AppConfig(title="Second"))
+
+    async with second.router.lifespan_context(second):
+        assert main._running_apps == running + 1
+        assert main._allocator_task is worker
+
+        transport = httpx.ASGITransport(app=second)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            assert (await c.get("/")).status_code == 200
+
+    assert main._running_apps == running
+    assert main._allocator_task is worker and not worker.done()
+
+    res = await client.post("/api/patients/start", json={
+        "name": "John Doe", "age": 45, "symptoms": "fever and cough",
+    })
+    await asyncio.wait_for(agent_manager.queue.join(), 5)
+    ticket = (await client.get(f"/api/tickets/{res.json()['ticket_id']}")).json()
+    assert ticket["doctor_id"] is not None
+
+
+async def test_failed_startup_is_not_counted(monkeypatch):
+    """
+    ✅ Test a first startup that fails while creating the database.
+    Expected: the error propagates and no app is counted as running, so
+    the next startup runs the full initialization again.
+    """
+    def broken_init_db(Base):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(main, "_running_apps", 0)
+    monkeypatch.setattr(main, "_allocator_task", None)
+    monkeypatch.setattr(main, "init_db", broken_init_db)
+
+    with pytest.raises(RuntimeError):
+        await main.startup_event()
+
+    assert main._running_apps == 0
+    assert main._allocator_task is None